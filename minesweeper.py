@@ -1,3 +1,5 @@
+import bisect
+import collections
 import itertools
 import random
 
@@ -21,13 +23,26 @@ class Minesweeper():
                 row.append(False)
             self.board.append(row)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Add mines randomly, drawing distinct cells in one go
+        for k in random.sample(range(self.height * self.width), mines):
+            i, j = divmod(k, self.width)
+            self.mines.add((i, j))
+            self.board[i][j] = True
+
+        # Count the mines around every cell once, so lookups are constant time
+        self.nearby = [[0] * self.width for i in range(self.height)]
+        for mine_i, mine_j in self.mines:
+            for i in range(max(mine_i - 1, 0), min(mine_i + 2, self.height)):
+                for j in range(max(mine_j - 1, 0), min(mine_j + 2, self.width)):
+                    if (i, j) != (mine_i, mine_j):
+                        self.nearby[i][j] += 1
+
+        # Cells that are neither mines nor next to one, for a guaranteed safe first move
+        self.very_safe = [
+            (i, j)
+            for i in range(self.height) for j in range(self.width)
+            if not self.board[i][j] and self.nearby[i][j] == 0
+        ]
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -58,23 +73,17 @@ class Minesweeper():
         not including the cell itself.
         """
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+        i, j = cell
+        return self.nearby[i][j]
 
-        return count
+    def random_very_safe(self):
+        """
+        Returns a random cell that is not a mine and has no
+        neighboring mines, or None if there is no such cell.
+        """
+        if self.very_safe:
+            return random.choice(self.very_safe)
+        return None
 
     def won(self):
         """
@@ -83,31 +92,85 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def iter_mask_cells(mask, width):
+    """
+    Yields the cells (i, j) of a bitmask where cell (i, j)
+    is bit i * width + j, lowest bit first.
+    """
+    while mask:
+        low = mask & -mask
+        yield divmod(low.bit_length() - 1, width)
+        mask ^= low
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+
+    The cells are stored as an integer bitmask, with cell (i, j)
+    mapped to bit i * width + j, so width must be the board width.
     """
 
-    def __init__(self, cells, count):
-        self.cells = set(cells)
+    __slots__ = ("width", "cell_mask", "count")
+
+    def __init__(self, cells, count, width):
+        self.width = width
+        self.cell_mask = 0
+        for cell in cells:
+            self.cell_mask |= self.bit(cell)
         self.count = count
 
+    @classmethod
+    def from_mask(cls, cell_mask, count, width):
+        """
+        Builds a sentence directly from a cell bitmask.
+        """
+        sentence = cls((), count, width)
+        sentence.cell_mask = cell_mask
+        return sentence
+
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        # Identity and the count are the cheapest checks, so try them before the mask
+        return self is other or (
+            self.count == other.count and self.cell_mask == other.cell_mask and self.width == other.width
+        )
+
+    def __hash__(self):
+        return hash((self.cell_mask, self.count, self.width))
 
     def __str__(self):
-        return f"{self.cells} = {self.count}"
+        return f"{set(self.iter_cells())} = {self.count}"
+
+    @property
+    def cells(self):
+        """
+        Returns the cells encoded in self.cell_mask, as an immutable
+        snapshot that can be hashed or shared between callers.
+        """
+        return frozenset(self.iter_cells())
+
+    def iter_cells(self):
+        """
+        Yields the cells encoded in self.cell_mask, lowest bit first.
+        """
+        return iter_mask_cells(self.cell_mask, self.width)
+
+    def bit(self, cell):
+        """
+        Returns the bitmask of a single cell.
+        """
+        return 1 << (cell[0] * self.width + cell[1])
 
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
         """
-        if len(self.cells) == self.count:
+        if self.cell_mask.bit_count() == self.count:
             return self.cells
         else:
-            return set()
+            return frozenset()
 
     def known_safes(self):
         """
@@ -116,24 +179,41 @@ class Sentence():
         if self.count == 0:
             return self.cells
         else:
-            return set()
+            return frozenset()
 
     def mark_mine(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be a mine.
         """
-        if cell in self.cells:
+        bit = self.bit(cell)
+        if self.cell_mask & bit:
             self.count -= 1
-            self.cells.remove(cell)
+            self.cell_mask ^= bit
 
     def mark_safe(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be safe.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        bit = self.bit(cell)
+        if self.cell_mask & bit:
+            self.cell_mask ^= bit
+
+    def mark_mines(self, cell_mask):
+        """
+        Marks every cell in cell_mask as a mine at once.
+        """
+        hit = self.cell_mask & cell_mask
+        if hit:
+            self.count -= hit.bit_count()
+            self.cell_mask ^= hit
+
+    def mark_safes(self, cell_mask):
+        """
+        Marks every cell in cell_mask as safe at once.
+        """
+        self.cell_mask &= ~cell_mask
 
 
 class MinesweeperAI():
@@ -147,22 +227,48 @@ class MinesweeperAI():
         self.height = height
         self.width = width
 
+        # Every cell on the board, used to pick random moves
+        self.all_cells = frozenset((i, j) for i in range(height) for j in range(width))
+
+        # Precompute the in-bounds neighbours of every cell
+        self.neighbors = [
+            [
+                tuple(
+                    (i + di, j + dj)
+                    for di in (-1, 0, 1) for dj in (-1, 0, 1)
+                    if (di or dj) and 0 <= i + di < height and 0 <= j + dj < width
+                )
+                for j in range(width)
+            ]
+            for i in range(height)
+        ]
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
         # Keep track of cells known to be safe or mines
-        self.mines = list()
-        self.safes = list()
+        self.mines = set()
+        self.safes = set()
+
+        # Cells known to be safe, in the order they were found, that may not have been played yet
+        self.safe_queue = collections.deque()
 
         # List of sentences about the game known to be true
         self.knowledge = []
 
+        # Sentences of self.knowledge keyed by (cell_mask, count), so each distinct sentence has a single instance.
+        # Marking cells changes the sentences, so this is only filled in while add_knowledge runs
+        self.interned = dict()
+
+        # (cell_mask, count) of the sentences already used for subset inference
+        self.inferred = set()
+
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
-        self.mines.append(cell)
+        self.mines.add(cell)
         for sentence in self.knowledge:
             sentence.mark_mine(cell)
 
@@ -171,68 +277,130 @@ class MinesweeperAI():
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
-        self.safes.append(cell)
+        if cell in self.safes:
+            return
+        self.safes.add(cell)
+        if cell not in self.moves_made:
+            self.safe_queue.append(cell)
         for sentence in self.knowledge:
             sentence.mark_safe(cell)
 
+    def mask_cells(self, cell_mask):
+        """
+        Returns the set of cells in a bitmask laid out like Sentence.cell_mask.
+        """
+        return set(iter_mask_cells(cell_mask, self.width))
+
+    def mark_mines(self, cell_mask):
+        """
+        Marks every cell in a bitmask as a mine, updating every sentence only once.
+        """
+        if not cell_mask:
+            return
+        self.mines |= self.mask_cells(cell_mask)
+        for sentence in self.knowledge:
+            sentence.mark_mines(cell_mask)
+
+    def mark_safes(self, cell_mask):
+        """
+        Marks every cell in a bitmask as safe, updating every sentence only once.
+        """
+        cells = self.mask_cells(cell_mask) - self.safes
+        if not cells:
+            return
+        self.safes |= cells
+        self.safe_queue.extend(cells - self.moves_made)
+        for sentence in self.knowledge:
+            sentence.mark_safes(cell_mask)
+
+    def _intern(self, cell_mask, count):
+        """
+        Returns the sentence in the knowledge base equal to (cell_mask, count),
+        adding a new one if there is none yet.
+        Only valid inside add_knowledge, after self.interned has been rebuilt.
+        """
+        key = (cell_mask, count)
+        sentence = self.interned.get(key)
+        if sentence is None:
+            sentence = self.interned[key] = Sentence.from_mask(cell_mask, count, self.width)
+            self.knowledge.append(sentence)
+        return sentence
+
     def add_knowledge(self, cell, count):
         """
         Called when the Minesweeper board tells us, for a given
         safe cell, how many neighboring cells have mines in them.
         """
+        if cell in self.moves_made:
+            return
         self.moves_made.add(cell)  # 1 Marks the cell as a move that has been made
         self.mark_safe(cell)  # 2 Marks the cell as safe
         cells = list()
         known_mines = 0
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-                if 0 <= i and i < self.height and 0 <= j and j < self.width:
-                    if (i, j) not in self.safes:
-                        cells.append((i, j))  # Fill the empty set with the unrevealed cells
-                    if (i, j) in self.mines:
-                        known_mines += 1
-
-        new_sentence = Sentence(cells, count - known_mines)
-        self.knowledge.append(new_sentence)  # 3 Add a new sentence to the knowledge base
-        removed_sentences = []
-        safe_cells = set()
-        mine_cells = set()
+        for neighbor in self.neighbors[cell[0]][cell[1]]:
+            if neighbor in self.mines:
+                known_mines += 1
+            elif neighbor not in self.safes:
+                cells.append(neighbor)  # Fill the empty set with the unrevealed cells
+
+        new_sentence = Sentence(cells, count - known_mines, self.width)
+        if new_sentence.count == 0:
+            self.mark_safes(new_sentence.cell_mask)  # A zero count needs no sentence, its cells are all safe
+        elif new_sentence.cell_mask:
+            self.knowledge.append(new_sentence)  # 3 Add a new sentence to the knowledge base
+        safe_mask = mine_mask = 0
         for sentence in self.knowledge:  # 4 For loop that marks cells as safe or mines based on the AI's knowledge base
-            for cell in sentence.known_safes():
-                safe_cells.add(cell)
-            for cell in sentence.known_mines():
-                mine_cells.add(cell)
-            if sentence.cells == set():
-                removed_sentences.append(sentence)
-        for safe_cell in safe_cells:
-            self.mark_safe(safe_cell)
-        for mine_cell in mine_cells:
-            self.mark_mine(mine_cell)
-        for sentence in removed_sentences:
-            self.knowledge.remove(sentence)
-        c = 0
-        removed_sentences_2 = []
-        added_sentences = []
-        for i in range(0, len(self.knowledge) - 1):  # 5 For loop that adds new sentences to the knowledge based using subset inferences
-            for j in range(i + 1, len(self.knowledge)):
-                if self.knowledge[i] == self.knowledge[j]:
-                    removed_sentences_2.append(self.knowledge[j])
-                    continue
-                if self.knowledge[i].cells & self.knowledge[j].cells == self.knowledge[j].cells:
-                    added_sentences.append(Sentence(self.knowledge[i].cells - self.knowledge[j].cells,self.knowledge[i].count - self.knowledge[j].count))
-
-                elif self.knowledge[j].cells & self.knowledge[i].cells == self.knowledge[i].cells:
-                    added_sentences.append(Sentence(self.knowledge[j].cells - self.knowledge[i].cells,self.knowledge[j].count - self.knowledge[i].count))
-
-        for sentence in removed_sentences_2:
-            if sentence in self.knowledge:
-                self.knowledge.remove(sentence)
-        for sentence in added_sentences:
-            if sentence not in self.knowledge:
-                self.knowledge.append(sentence)
+            if sentence.count == 0:
+                safe_mask |= sentence.cell_mask
+            elif sentence.cell_mask.bit_count() == sentence.count:
+                mine_mask |= sentence.cell_mask
+        self.mark_safes(safe_mask)
+        self.mark_mines(mine_mask)
+        # Marking cells changes the value of the sentences, so re-intern them,
+        # dropping empty and duplicate sentences in one pass
+        self.interned = dict()
+        for sentence in self.knowledge:
+            if sentence.cell_mask:
+                self.interned.setdefault((sentence.cell_mask, sentence.count), sentence)
+        self.knowledge = list(self.interned.values())
+        inferred = self.inferred
+        self.inferred = set(self.interned)
+        k_sorted = sorted(self.knowledge, key=lambda sentence: sentence.cell_mask.bit_count())
+        # Plain lists and local names keep attribute lookups out of the pair loop
+        masks = [sentence.cell_mask for sentence in k_sorted]
+        counts = [sentence.count for sentence in k_sorted]
+        lengths = [mask.bit_count() for mask in masks]
+        seen = [(mask, mask_count) in inferred for mask, mask_count in zip(masks, counts)]
+        inferred_pairs = []
+        for i, (mask, mask_count) in enumerate(zip(masks, counts)):  # 5 For loop that adds new sentences to the knowledge based using subset inferences
+            # Pairs of sentences that are both unchanged since the last call were already inferred from
+            if seen[i]:
+                continue
+            # Smallest first: only strictly shorter sentences can be proper subsets, and only strictly longer ones
+            # proper supersets, equal ones were deduplicated above
+            # New shorter sentences reach this one through their own longer loop, so only pair with unchanged ones here
+            shorter = bisect.bisect_left(lengths, lengths[i])
+            for small_mask, small_count, small_seen in zip(masks[:shorter], counts[:shorter], seen[:shorter]):
+                if small_seen and mask & small_mask == small_mask:
+                    inferred_pairs.append((mask & ~small_mask, mask_count - small_count))
+            longer = bisect.bisect_right(lengths, lengths[i])
+            for large_mask, large_count in zip(masks[longer:], counts[longer:]):
+                if large_mask & mask == mask:
+                    inferred_pairs.append((large_mask & ~mask, large_count - mask_count))
+
+        # Differences that are all safe or all mines are marked straight away instead of kept as sentences
+        safe_mask = mine_mask = 0
+        for diff_mask, diff_count in inferred_pairs:
+            if diff_count == 0:
+                safe_mask |= diff_mask
+            elif diff_count == diff_mask.bit_count():
+                mine_mask |= diff_mask
+            else:
+                self._intern(diff_mask, diff_count)
+        self.mark_safes(safe_mask)
+        self.mark_mines(mine_mask)
+        # The marking above may have changed interned sentences, so their keys are stale now
+        self.interned.clear()
 
     def make_safe_move(self):
         """
@@ -240,19 +408,20 @@ class MinesweeperAI():
         The move must be known to be safe, and not already a move
         that has been made.
         """
-        for move in self.safes:
-            if move not in self.moves_made and move not in self.mines:
-                return move
+        # Cells that were played since they were queued are dropped lazily
+        while self.safe_queue and self.safe_queue[0] in self.moves_made:
+            self.safe_queue.popleft()
+        if self.safe_queue:
+            return self.safe_queue[0]
         return None
 
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
         """
-        for i in range(0, 500):
-            move = (random.randrange(0, self.height), random.randrange(0, self.width))
-            if move not in self.mines and move not in self.moves_made:
-                return move
+        candidates = self.all_cells - self.moves_made - self.mines
+        if candidates:
+            return random.choice(tuple(candidates))
         return None
 
     def make_very_safe_move(self,minesweeper_obj):
@@ -260,8 +429,4 @@ class MinesweeperAI():
         Returns a safe cell that's not next to any mines
         Called only once, at the start of each run, to assure the AI doesn't select a mine
         """
-        for i in range(0, 500):
-            move = (random.randrange(0, self.height), random.randrange(0, self.width))
-            if minesweeper_obj.board[move[0]][move[1]] == False and minesweeper_obj.nearby_mines(move) == 0:
-                return move
-        return None
\ No newline at end of file
+        return minesweeper_obj.random_very_safe()